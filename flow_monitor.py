@@ -1,21 +1,49 @@
 import argparse
+import atexit
 import configparser
 import logging
+import logging.handlers
 import pprint
 import locate_iot
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import rachio
 import queue
 import enum
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import heapq
+import itertools
+import concurrent.futures
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import json
+import operator
+import os
 import threading
+# orjson parses JSON several times faster than the stdlib; fall back when missing
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps       # returns bytes
+except ImportError:
+    json_loads = json.loads
+    def json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
 from influxdb_client import InfluxDBClient, Point
-from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client.client.write_api import WriteOptions
 import datetime
 import time
 import water_meter
 
+################################################################################
+# use a single session for all outgoing requests so that connections to the
+# various servers are pooled and kept alive rather than re-established per call
+http_session = requests.Session()
+http_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8,
+        max_retries=Retry(total=2, backoff_factor=0.2))
+http_session.mount('http://', http_adapter)
+http_session.mount('https://', http_adapter)
+
 # As the webhook mechanism requires a public interface, an additional external mechanism must be set
 # up to forward the notification to a system behind a NAT router.
 # This implementation will use ngrok as it requires a minimal amount of configuration.
@@ -52,17 +80,40 @@ args = parser.parse_args()
 # read configuration
 local_config_file = 'irrigation.ini'
 system_config_file = '/usr/local/etc/irrigation.ini'
-config = configparser.ConfigParser()
+# no config values use interpolation, so skip that machinery when parsing
+config = configparser.ConfigParser(interpolation=None)
 for config_file in (local_config_file, system_config_file):
     if file_read := config.read(config_file):
         break
 else:
     exit("Error: no configuration file found")
 
+# fetch required configuration values, exiting with a clear message when absent
+def require_config(section_name, *items):
+    if section_name not in config:
+        exit(f'[{section_name}] section of {config_file} missing')
+    section = config[section_name]
+    values = []
+    for item in items:
+        value = section.get(item)
+        if value is None:
+            exit(f'Unable to find {item} in [{section_name}] section of {config_file}')
+        values.append(value)
+    return values
+
 ################################################################################
-# set up logging
+# set up logging - records pass through a queue and are emitted from a
+# listener thread so logging in the event loop never blocks on stream I/O
 log = logging.getLogger(__name__)
-logging.basicConfig(format='%(filename)s %(message)s', level=logging.INFO)
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(logging.Formatter('%(filename)s %(message)s'))
+root_logger = logging.getLogger()
+root_logger.setLevel(logging.INFO)
+root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+log_listener = logging.handlers.QueueListener(log_queue, log_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
 
 ################################################################################
 # generate a configuration file if requested
@@ -77,8 +128,10 @@ Name            .Host name for the watermeter
 MacAddr         .MAC address for watermeter (for MacOS)
 [INFLUXDB]
 Server          .URL for the InfluxDB server
-Org `           .Organization name 
+Org `           .Organization name
 Token           .Token for accessing the 'irrigation' Bucket
+[NTFY]
+Topic           .ntfy topic for fault notifications (defaults to ~/.ntfy)
 '''
 if args.configure:
     if file_read==local_config_file:
@@ -101,62 +154,62 @@ if args.configure:
 ################################################################################
 # The MacOS sometimes has trouble looking up IOT IP addresses
 # verify that the system will be able to determine the IP address of the water meter
-section_name = 'WATERMETER'
-try:
-    watermeter_config = config[section_name]
-except KeyError:
-    exit(f'[{section_name}] section of {config_file} missing')
-try:
-    watermeter_name = watermeter_config['Name']
-    watermeter_mac_addr = watermeter_config.get('MacAddr', None)
-except KeyError as a:
-    exit(f'Unable to find {a} in [{section_name}] section of {config_file}')
+watermeter_name, = require_config('WATERMETER', 'Name')
+watermeter_mac_addr = config['WATERMETER'].get('MacAddr', None)
 wm_name = locate_iot.locate(watermeter_name, watermeter_mac_addr)
 
 log.debug('water meter located at %s', wm_name)
 
+def read_water_meter(max_age=2.0):
+    # the resolved address is pinned for speed, but the meter's DHCP lease
+    # can move it mid-run; on a failed read, re-resolve and retry once
+    global wm_name
+    data = water_meter.read_meter(wm_name, max_age)
+    if not data:
+        wm_name = locate_iot.locate(watermeter_name, watermeter_mac_addr, refresh=True)
+        log.info('water meter re-located at %s', wm_name)
+        data = water_meter.read_meter(wm_name, max_age)
+    return data
+
 ################################################################################
 # verify ngrok tunnel is up and determine the public endpoint url
-section_name = 'NGROK'
-try:
-    ngrok_config = config[section_name]
-except KeyError:
-    exit(f'[{section_name}] section of {config_file} missing')
-try:
-    ngrok_host = ngrok_config['ClientHost']
-except KeyError as a:
-    exit(f'Unable to find {a} in [{section_name}] section of {config_file}')
+ngrok_host, = require_config('NGROK', 'ClientHost')
 
 try:
-    ngrok = requests.get(f'http://{ngrok_host}:4040/api/tunnels')
+    ngrok = http_session.get(f'http://{ngrok_host}:4040/api/tunnels', timeout=5)
 except requests.exceptions.ConnectionError:
     exit('Error - ngrok agent is not running')
 
-tunnel0 = ngrok.json()['tunnels'][0]
-tunnel_public_url = tunnel0['public_url']
-tunnel_local_addr = tunnel0['config']['addr']
+# parse the tunnel description once, directly from the response bytes
+try:
+    tunnel0 = json_loads(ngrok.content)['tunnels'][0]
+    tunnel_public_url = tunnel0['public_url']
+    tunnel_local_addr = tunnel0['config']['addr']
+except (ValueError, LookupError):
+    exit('Error - unexpected tunnel description from ngrok agent')
 tunnel_local_port = int(tunnel_local_addr.split(':')[-1])
 log.debug('ngrok public endpoint at %s', tunnel_public_url)
 
 ################################################################################
 # determine the rachio valve mapping
-section_name = 'RACHIO'
-try:
-    rachio_config = config['RACHIO']
-except KeyError:
-    exit(f'{section_name} section missing from {config_file}')
+rachio_api_key, rachio_name = require_config('RACHIO', 'APIkey', 'Name')
 
+# startup cannot proceed without the controller, so API failures here are
+# still fatal; once running, rachioError is caught and retried instead
 try:
-    rachio_api_key = rachio_config['APIkey']
-    rachio_name = rachio_config['Name']
-except KeyError as a:
-    exit(f'Unable to find {a} in [{section_name}] section of {config_file}')
-
-controller = rachio.rachio(rachio_api_key, rachio_name)
+    controller = rachio.rachio(rachio_api_key, rachio_name)
+except rachio.rachioError as e:
+    exit(f'Error: {e}')
 
 ################################################################################
 # set up state variables for each valve
 class zone_state:
+    # slots keep the long-lived per-zone instances compact and make the
+    # attribute accesses in the event loop skip the instance __dict__
+    # (startId is assigned later, during START processing)
+    __slots__ = ('valve_open', 'meter_start_value', 'flow_timer', 'flow',
+                 'usage', 'id', 'name', 'flow_limit', 'startId')
+
     def __init__(self, zone_id, zone_name):
         self.valve_open = False
         self.meter_start_value = None
@@ -165,46 +218,144 @@ class zone_state:
         self.usage = 0
         self.id = zone_id
         self.name = zone_name
+        self.flow_limit = None
+
+# per-zone flow limits (gpm) come from the optional [FLOW] section, keyed by
+# zone number; parse them once here so the event loop never consults the
+# config parser
+flow_limits = {}
+if 'FLOW' in config:
+    for key, value in config['FLOW'].items():
+        try:
+            flow_limits[int(key)] = float(value)
+        except ValueError:
+            exit(f'Invalid [FLOW] entry {key} = {value} in {config_file}')
 
-zone_info = controller.get_zones()
+try:
+    zone_info = controller.get_zones()
+except rachio.rachioError as e:
+    exit(f'Error: {e}')
 zones = {}
 for zone in zone_info:                  # zone is the integer value number
     zid = zone_info[zone]['id']         # Rachio assigned identifier
     zname = zone_info[zone]['name']     # user assigned name for the zone
     zones[zone] = zone_state(zid, zname)
+    zones[zone].flow_limit = flow_limits.get(zone)
     log.debug('%d: %s %s', zone, zid, zname)
 
+# zone numbers are small dense integers, so the event loop looks them up by
+# list index instead of hashing into the dict (inactive numbers hold None)
+zone_by_number = [None] * (max(zones) + 1)
+for number, zone in zones.items():
+    zone_by_number[number] = zone
+
 ################################################################################
 # create event queue for webhook and flow measurement callback
-event_queue = queue.Queue()
+event_queue = queue.SimpleQueue()
 class EVENT_TYPE(enum.Enum):
     WEBHOOK = 1     # received webhook POST message
     FLOW_TIMER = 2  # callback from webhook START message
 
+# pre-bind the members touched on every event so the hot paths skip the
+# enum class-attribute lookup
+EV_WEBHOOK = EVENT_TYPE.WEBHOOK
+EV_FLOW_TIMER = EVENT_TYPE.FLOW_TIMER
+
 webhook_path = '/rachio.json'
+max_webhook_body = 64*1024      # far larger than any legitimate Rachio event
+
+# Rachio's eventType values form a fixed enumeration, so each zone-run type is
+# mapped to its action once and the event loop does a single dict lookup
+# rather than a chain of substring scans
+webhook_test_event = 'WEBHOOK_TEST'     # private type to test webhook forwarding
+# the nightly self-test message never varies, so encode it once
+webhook_test_body = json_dumps({'eventType': webhook_test_event, 'eventId': None, 'payload': None})
+json_headers = {'content-type': 'application/json'}
+ok_response = b'OK'
+zone_run_actions = {
+    'DEVICE_ZONE_RUN_STARTED_EVENT':   'STARTED',
+    'DEVICE_ZONE_RUN_PAUSED_EVENT':    'PAUSED',
+    'DEVICE_ZONE_RUN_STOPPED_EVENT':   'STOPPED',
+    'DEVICE_ZONE_RUN_COMPLETED_EVENT': 'COMPLETED',
+}
+
+# extract the fields of interest from webhook messages in one C-level call
+event_fields = operator.itemgetter('eventId', 'eventType', 'payload')
+zone_run_fields = operator.itemgetter('durationSeconds', 'zoneNumber')
+
+################################################################################
+# a single thread multiplexes all pending one-shot timers over a heap rather
+# than spawning a new threading.Timer thread for each zone start
+class timer_scheduler:
+    def __init__(self):
+        self._available = threading.Condition()
+        self._timers = []
+        self._counter = itertools.count()   # tie-breaker so heap entries never compare actions
+        threading.Thread(target=self._run, daemon=True).start()
+
+    # call action(argument) after delay seconds have elapsed
+    def enter(self, delay, action, argument):
+        with self._available:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._counter), action, argument))
+            self._available.notify()
+
+    def _run(self):
+        while True:
+            with self._available:
+                while not self._timers:
+                    self._available.wait()
+                deadline, _, action, argument = self._timers[0]
+                timeout = deadline - time.monotonic()
+                if timeout > 0:
+                    self._available.wait(timeout)
+                    continue
+                heapq.heappop(self._timers)
+            action(argument)
+
+timer_sched = timer_scheduler()
+
+################################################################################
+# water meter reads are an HTTP round trip; issue them from a small pool so the
+# main event loop is never stalled waiting on the meter
+meter_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
 
 ################################################################################
 # create a simple web server to receive the webhook POST messages from Rachio
 class PostHandler(BaseHTTPRequestHandler):
+    # send the short OK response immediately rather than letting Nagle's
+    # algorithm hold it back waiting for more data
+    disable_nagle_algorithm = True
+
     def validate(s):
         if s.path != webhook_path:
             return None
+        # fetch each header exactly once
+        content_length = s.headers.get('Content-Length')
+        content_type = s.headers.get('Content-Type')
+        if content_length is None or content_type is None:
+            return None
         try:
-            content_length = int(s.headers['Content-Length'])
-            content_type = s.headers['Content-Type']
-        except KeyError:
+            content_length = int(content_length)
+        except ValueError:
             return None
 
-        if content_length > 1000:
+        if not 0 < content_length <= max_webhook_body:
             return None
-        if content_type != 'application/json':
+        # accept parameterized forms such as 'application/json; charset=utf-8'
+        if content_type.split(';', 1)[0].strip().lower() != 'application/json':
             return None
 
-        post_data = s.rfile.read(content_length)
+        # read the body in one shot into a preallocated buffer
+        post_data = bytearray(content_length)
+        if s.rfile.readinto(post_data) != content_length:
+            return None
 
         try:
-            data = json.loads(post_data)
-        except ValueError:
+            data = json_loads(post_data)
+        except ValueError:    # orjson.JSONDecodeError is a subclass
+            return None
+        # valid JSON need not be an object; everything downstream expects one
+        if not isinstance(data, dict):
             return None
         return data
     
@@ -214,11 +365,17 @@ class PostHandler(BaseHTTPRequestHandler):
             s.send_error(400, 'Bad Request')
             return
 
+        # start the water meter read now so it overlaps event dispatch
+        if data.get('eventType') in zone_run_actions:
+            meter_future = meter_pool.submit(read_water_meter)
+        else:
+            meter_future = None
+
         s.send_response(200)
         s.end_headers()
-        s.wfile.write('OK'.encode('utf-8'))
+        s.wfile.write(ok_response)
 
-        event_queue.put((EVENT_TYPE.WEBHOOK, data))
+        event_queue.put((EV_WEBHOOK, (data, meter_future)))
 
     # redefine the class logging functions to use standard logging rather
     # than writing directly to stderr
@@ -228,7 +385,7 @@ class PostHandler(BaseHTTPRequestHandler):
         log.debug(format, *args)
         
 # start the web server in its own thread
-httpd = HTTPServer(('', tunnel_local_port), PostHandler)
+httpd = ThreadingHTTPServer(('', tunnel_local_port), PostHandler)
 log.debug('Webhook web server listening on %s', tunnel_local_addr)
 server_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
 server_thread.start()
@@ -236,25 +393,47 @@ server_thread.start()
 ################################################################################
 # install webhooks at Rachio
 webhook_url = tunnel_public_url + webhook_path
-controller.add_device_zone_run_webhook(webhook_url)
+try:
+    controller.add_device_zone_run_webhook(webhook_url)
+except rachio.rachioError as e:
+    exit(f'Error: {e}')
 
 ################################################################################
 # set up connection to database
-section_name = 'INFLUXDB'
-try:
-    influx_config = config[section_name]
-except KeyError:
-    exit(f'{section_name} section missing from {config_file}')
-try:
-    influx_server = influx_config['Server']
-    influx_token = influx_config['Token']
-    influx_org = influx_config['Org']
-    influx_bucket = 'irrigation'
-except KeyError as a:
-    exit(f'Unable to find {a} in [{section_name}] section of {config_file}')
+influx_server, influx_token, influx_org = require_config('INFLUXDB', 'Server', 'Token', 'Org')
+influx_bucket = 'irrigation'
 
+# the batching write api accumulates points and flushes them from a background
+# thread, keeping the InfluxDB round trip off the event-loop thread
 influx_client = InfluxDBClient(url=influx_server, token=influx_token, org=influx_org)
-influx_write_api = influx_client.write_api(write_options=SYNCHRONOUS)
+influx_write_api = influx_client.write_api(write_options=WriteOptions(
+        batch_size=50, flush_interval=10_000, jitter_interval=2_000, retry_interval=5_000))
+atexit.register(influx_client.close)        # flush pending points on shutdown
+atexit.register(influx_write_api.close)
+
+################################################################################
+# set up fault notification via ntfy
+# the topic comes from the configuration file, falling back to ~/.ntfy
+ntfy_topic = config.get('NTFY', 'Topic', fallback=None)
+if not ntfy_topic:
+    try:
+        with open(os.path.expanduser('~/.ntfy'), encoding='utf-8') as ntfy_fd:
+            ntfy_topic = ntfy_fd.read().strip()
+    except OSError:
+        pass
+if ntfy_topic:
+    ntfy_url = f'https://ntfy.sh/{ntfy_topic}'
+else:
+    ntfy_url = None
+    log.warning('no ntfy topic configured - notifications disabled')
+
+def send_notification(message):
+    if ntfy_url is None:
+        return
+    try:
+        http_session.post(ntfy_url, data=message.encode('utf-8'), timeout=5)
+    except requests.exceptions.RequestException as e:
+        log.error('send_notification failed with %s', e)
 
 ################################################################################
 # every night check for leaks over an hour interval, record daily water usage,
@@ -268,17 +447,26 @@ def leak_check(test_mode=False):
             target_time = now.replace(hour=23,minute=0,second=0,microsecond=0)
             if target_time < now:
                 target_time += datetime.timedelta(days=1)
-            delay = (target_time - now).seconds
+            delay = max(0.0, (target_time - now).total_seconds())
             log.debug('leak_check will start in %d seconds', delay)
-            time.sleep(delay)
-
-        # make two water meter readings one hour apart
-        start_reading = water_meter.read_meter(wm_name)
-        log.debug('First leak test meter reading: %s', pprint.pformat(start_reading))
+            # sleep in bounded slices, re-checking the wall clock each time, so
+            # an NTP step, DST change, or suspend/resume cannot leave the
+            # thread sleeping past the target or waking long before it
+            while delay > 0:
+                time.sleep(min(delay, 300))
+                delay = (target_time - datetime.datetime.now()).total_seconds()
+
+        # make two water meter readings one hour apart; max_age=0 bypasses the
+        # read cache so each reading is a real meter round trip even when
+        # --leak_test makes them back to back
+        start_reading = read_water_meter(max_age=0)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('First leak test meter reading: %s', pprint.pformat(start_reading))
         if not test_mode:
             time.sleep(60*60)
-        end_reading = water_meter.read_meter(wm_name)
-        log.debug('Second leak test meter reading: %s', pprint.pformat(end_reading))
+        end_reading = read_water_meter(max_age=0)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('Second leak test meter reading: %s', pprint.pformat(end_reading))
         test_mode = False
 
         # check for water usage (leakage)
@@ -293,6 +481,7 @@ def leak_check(test_mode=False):
         # log the leak
         if leakage and leakage > 0.1:
             log.warning('One hour leakage of %0.3f cf detected', leakage)
+            send_notification(f'One hour leakage of {leakage:0.3f} cf detected')
 
         # log daily meter reading and leakage to database
         if end_value is not None:
@@ -301,10 +490,8 @@ def leak_check(test_mode=False):
             influx_write_api.write(bucket=influx_bucket, record=point, org=influx_org)
 
         # send a POST test message to public webhook site
-        headers = {"content-type": "application/json"}
-        payload = {"eventType": "WEBHOOK_TEST", 'eventId':None, 'payload':None}
         try :
-            requests.post(webhook_url, json=payload, headers=headers)
+            http_session.post(webhook_url, data=webhook_test_body, headers=json_headers, timeout=5)
         except requests.exceptions.RequestException as e:
             log.error('POST to webhook URL failed with %s', e)
 
@@ -320,125 +507,165 @@ leak_thread.start()
 
 ################################################################################
 # process events from queue
+# recently seen webhook eventIds, oldest first, used to drop retried deliveries
+recent_event_ids = OrderedDict()
 try:
     while True:
-        q = event_queue.get()
-        log.debug('%s', pprint.pformat(q))
-        etype, edata = q
-        if etype is EVENT_TYPE.WEBHOOK:
-
-            # decode the message and verify type
-            try:
-                eventId = edata['eventId']
-                eventType = edata['eventType']
-                payload = edata['payload']
-            except KeyError as e:
-                log.warning('Problem extracting %s from webhook POST response', e)
-                continue
-
-            if "WEBHOOK_TEST" in eventType:     # private type to test webhook forwarding
-                test_message_received.set()
-                continue
-            if "DEVICE_ZONE_RUN" not in eventType:
-                log.warning(f'ignoring {eventType}')
-                continue
-
-            try:
-                duration = int(payload['durationSeconds'])
-                zoneNumber = int(payload['zoneNumber'])
-            except KeyError as e:
-                log.warning('Problem extracting %s from webhook POST response', e)
-                continue
-
+        # block for the next event, then drain anything else already queued so
+        # bursts of back-to-back zone transitions are handled in one pass
+        batch = [event_queue.get()]
+        while True:
             try:
-                zone = zones[zoneNumber]            # zoneNumber could be out of range
-            except KeyError as e:
-                log.warning('Processing webhook: Zone %s is not an active zone', e)
-                continue
-
-            # read the water usage meter
-            meter_data = water_meter.read_meter(wm_name)
-            log.debug('Water meter reading at webhook: %s', pprint.pformat(meter_data))
+                batch.append(event_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        for q in batch:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug('%s', pprint.pformat(q))
+            etype, edata = q
+            if etype is EV_WEBHOOK:
+                edata, meter_future = edata
+
+                # decode the message and verify type
+                try:
+                    eventId, eventType, payload = event_fields(edata)
+                except KeyError as e:
+                    log.warning('Problem extracting %s from webhook POST response', e)
+                    continue
 
-            if zone.valve_open:
-                if "STARTED" in eventType:
-                    log.info('Zone %d %s START - ignored, valve already open', zoneNumber, zone.name)
+                if eventType == webhook_test_event:
+                    test_message_received.set()
+                    continue
+                action = zone_run_actions.get(eventType)
+                if action is None:
+                    log.warning('ignoring %s', eventType)
                     continue
-                zone.valve_open = False
-
-                # else eventType must be one of PAUSED/STOPPED/COMPLETED
-
-                # determine water usage - None if any readings failed
-                meter_end_value = meter_data.get('accumulated', None)
-                if zone.usage is None:
-                    usage = None
-                elif zone.meter_start_value is None:
-                    usage = None
-                elif meter_end_value is None:
-                    usage = None
-                else:
-                    usage = zone.usage + meter_end_value - zone.meter_start_value
 
-                if "PAUSED" in eventType:       # operator has paused the zone, to be STARTED later
-                    log.debug('Zone %s paused', zone.name)
-                    zone.usage = usage
+                # eventId came off the network and is used as a dict key
+                # below; an unhashable value would raise out of the event loop
+                if not isinstance(eventId, str):
+                    log.warning('ignoring webhook with non-string eventId %r', eventId)
                     continue
 
-                # log data collected
-                point = Point(zone.name).field("usage", usage).field("flow", zone.flow).field("duration", duration)
-                influx_write_api.write(bucket='irrigation', record=point)
+                # Rachio occasionally retries delivery; drop an event already
+                # handled so it cannot trigger a second meter read and write
+                if eventId in recent_event_ids:
+                    log.debug('ignoring duplicate delivery of event %s', eventId)
+                    continue
+                recent_event_ids[eventId] = None
+                if len(recent_event_ids) > 256:
+                    recent_event_ids.popitem(last=False)
+
+                try:
+                    duration, zoneNumber = map(int, zone_run_fields(payload))
+                except KeyError as e:
+                    log.warning('Problem extracting %s from webhook POST response', e)
+                    continue
 
-                # reformat data for logging/messages
-                if usage is None:
-                    usage = 'unknown usage'
-                else:
-                    usage = f'{usage:.2f} cf'
-                if zone.flow is None:
-                    flow = 'unknown flow'
-                else:
-                    flow = f'{zone.flow:.2f} gpm'
+                # zoneNumber could be out of range
+                zone = zone_by_number[zoneNumber] if 0 <= zoneNumber < len(zone_by_number) else None
+                if zone is None:
+                    log.warning('Processing webhook: Zone %d is not an active zone', zoneNumber)
+                    continue
 
-                # log the event
-                if "STOPPED" in eventType:    # operator has stopped the zone
-                    log.debug('Zone %d %s stopped - %s, %s', zoneNumber, zone.name, usage, flow)
-                elif "COMPLETED" in eventType:  # zone schedule has run to completion
-                    log.debug('Zone %d %s completed - %s, %s', zoneNumber, zone.name, usage, flow)
+                # collect the water meter reading started when the webhook arrived
+                if meter_future is None:
+                    meter_data = read_water_meter()
                 else:
-                    log.warning('Received unexpected eventType %s', eventType)
-
-                # reset zone values
-                zone.usage = 0
-                zone.flow = None
-
-            else:   # valve is closed
-                if "STARTED" in eventType:
-                    log.debug('Zone %d %s started', zoneNumber, zone.name)
-                    zone.valve_open = True
-                    zone.meter_start_value = meter_data.get('accumulated', None)
-                    zone.startId = eventId
-                    # wait for line pressure to equalize before reading flow rate
+                    try:
+                        meter_data = meter_future.result(timeout=10)
+                    except concurrent.futures.TimeoutError:
+                        log.error('Timed out waiting for water meter reading')
+                        meter_data = {}
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug('Water meter reading at webhook: %s', pprint.pformat(meter_data))
+
+                if zone.valve_open:
+                    if action == 'STARTED':
+                        log.info('Zone %d %s START - ignored, valve already open', zoneNumber, zone.name)
+                        continue
+                    zone.valve_open = False
+
+                    # else action must be one of PAUSED/STOPPED/COMPLETED
+
+                    # determine water usage - None if any readings failed
+                    meter_end_value = meter_data.get('accumulated', None)
+                    if zone.usage is None:
+                        usage = None
+                    elif zone.meter_start_value is None:
+                        usage = None
+                    elif meter_end_value is None:
+                        usage = None
+                    else:
+                        usage = zone.usage + meter_end_value - zone.meter_start_value
+
+                    if action == 'PAUSED':          # operator has paused the zone, to be STARTED later
+                        log.debug('Zone %s paused', zone.name)
+                        zone.usage = usage
+                        continue
+
+                    # log data collected
+                    point = Point(zone.name).field("usage", usage).field("flow", zone.flow).field("duration", duration)
+                    influx_write_api.write(bucket='irrigation', record=point)
+
+                    # reformat data for logging/messages
+                    if usage is None:
+                        usage = 'unknown usage'
+                    else:
+                        usage = f'{usage:.2f} cf'
                     if zone.flow is None:
-                        args = ((EVENT_TYPE.FLOW_TIMER, (zoneNumber,eventId)),)
-                        zone.timer = threading.Timer(20, event_queue.put, args=args)
-                        zone.timer.start()
-                else:
-                    log.info('Valve %d %s is not open - ignoring %s', zoneNumber, zone.name, eventType)
-
-        elif etype is EVENT_TYPE.FLOW_TIMER:
-            # the delay in receiving zone notifications could result in reading the
-            # meter either after the valve has closed or has switched to another
-            # zone. This is unlikely as the flow measurement is made 20 seconds into
-            # the irrigation cycle, which will probably only occur on the ending
-            # cycle of a zone using the 'soak' feature
-            zoneNumber, timerId = edata
-            zone = zones[zoneNumber]
-            if not zone.valve_open or zone.startId != timerId:
-                continue
-            meter_data = water_meter.read_meter(wm_name)
-            log.debug(pprint.pformat(meter_data))
-            zone.flow = meter_data.get('flow', None)
-        else:
-            log.warning('Unknown event %s', etype)
+                        flow = 'unknown flow'
+                    else:
+                        flow = f'{zone.flow:.2f} gpm'
+
+                    # log the event
+                    if action == 'STOPPED':         # operator has stopped the zone
+                        log.debug('Zone %d %s stopped - %s, %s', zoneNumber, zone.name, usage, flow)
+                    else:                           # COMPLETED - zone schedule has run to completion
+                        log.debug('Zone %d %s completed - %s, %s', zoneNumber, zone.name, usage, flow)
+
+                    # reset zone values
+                    zone.usage = 0
+                    zone.flow = None
+
+                else:   # valve is closed
+                    if action == 'STARTED':
+                        log.debug('Zone %d %s started', zoneNumber, zone.name)
+                        zone.valve_open = True
+                        zone.meter_start_value = meter_data.get('accumulated', None)
+                        zone.startId = eventId
+                        # wait for line pressure to equalize before reading flow rate
+                        if zone.flow is None:
+                            timer_sched.enter(20, event_queue.put, (EV_FLOW_TIMER, (zoneNumber, eventId)))
+                    else:
+                        log.info('Valve %d %s is not open - ignoring %s', zoneNumber, zone.name, eventType)
+
+            elif etype is EV_FLOW_TIMER:
+                # the delay in receiving zone notifications could result in reading the
+                # meter either after the valve has closed or has switched to another
+                # zone. This is unlikely as the flow measurement is made 20 seconds into
+                # the irrigation cycle, which will probably only occur on the ending
+                # cycle of a zone using the 'soak' feature
+                zoneNumber, timerId = edata
+                zone = zone_by_number[zoneNumber]
+                if not zone.valve_open or zone.startId != timerId:
+                    continue
+                meter_data = read_water_meter()
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug(pprint.pformat(meter_data))
+                zone.flow = meter_data.get('flow', None)
+
+                # report zones flowing above their configured limit
+                if zone.flow is not None and zone.flow_limit is not None \
+                        and zone.flow > zone.flow_limit:
+                    log.warning('Zone %d %s flow of %.2f gpm exceeds limit of %.2f gpm',
+                            zoneNumber, zone.name, zone.flow, zone.flow_limit)
+                    send_notification(
+                            f'Zone {zone.name} flow of {zone.flow:.2f} gpm'
+                            f' exceeds limit of {zone.flow_limit:.2f} gpm')
+            else:
+                log.warning('Unknown event %s', etype)
 
 except KeyboardInterrupt:
     pass
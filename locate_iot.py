@@ -3,25 +3,48 @@ import platform
 import os
 import logging
 import subprocess
+import time
 
 '''
 This module verifies that the operating system will be able to obtain a network
 address for the named IOT device. If the DNS/mDNS lookup fails, it will attempt
 to determine the device's IP address from the supplied MAC address.
 
-The routine will return either the fully qualifed name or its IP address
+The routine will return the device's IP address so that callers do not repeat
+the DNS/mDNS lookup on every connection
 '''
 log = logging.getLogger(__name__)
 
-def locate(iot_name, mac_address):
+# addresses already discovered this run, so repeat calls skip the DNS probes
+# (and the possible arp-scan) entirely
+_located = {}
+
+def locate(iot_name, mac_address, refresh=False):
+    # refresh forces a new lookup when a previously returned address has
+    # stopped responding (e.g. the device picked up a new DHCP lease)
+    if not refresh:
+        cached = _located.get((iot_name, mac_address))
+        if cached is not None:
+            return cached
+
     # check to see if the host will be able to determine the IP address of the IOT device
-    for domain in ('', '.attlocal.net', '.local'):
-        full_iot_name = iot_name + domain
-        try:
-            socket.gethostbyname(full_iot_name)
-            break
-        except socket.gaierror:
-            pass
+    # DNS failures are frequently transient, so retry the lookups with a short
+    # backoff before resorting to the far more expensive arp-scan fallback
+    for attempt in range(3):
+        if attempt:
+            time.sleep(0.25 * 2**attempt)
+        for domain in ('', '.attlocal.net', '.local'):
+            full_iot_name = iot_name + domain
+            try:
+                # keep the resolved address - mDNS lookups in particular can take
+                # tens of milliseconds, so they should only happen once
+                full_iot_name = socket.gethostbyname(full_iot_name)
+                break
+            except socket.gaierror:
+                pass
+        else:
+            continue
+        break
     else:
         # the system was unable to determine the IOT device's IP address using the name lookup,
         # so use arp-scan to dump the address information of all devices on the subnet
@@ -41,10 +64,10 @@ def locate(iot_name, mac_address):
         log.info('Searching for %s at MAC address %s', iot_name, mac_address)
 
         # use netstat to list all of the network interfaces
-        ns = subprocess.run(['netstat', '-rnf', 'inet'], capture_output=True)
+        ns = subprocess.run(['netstat', '-rnf', 'inet'], capture_output=True, text=True)
 
         # locate the default interface and extract name of the interface
-        for line in str(ns.stdout, encoding='utf-8').split('\n'):
+        for line in ns.stdout.splitlines():
             if line.startswith('default') or line.startswith('0.0.0.0'):
                 interface = line.split()[-1]
                 break
@@ -53,20 +76,22 @@ def locate(iot_name, mac_address):
         log.info('Searching on network interface %s', interface)
 
         for i in range(1,3):      # try this a couple of times as it sometimes doesn't work
-            # scan the subnet
-            hosts = subprocess.run(['arp-scan', '--localnet', f'--interface={interface}', '--quiet'], capture_output=True)
-
-            # locate the target MAC address from the responses
-            text = str(hosts.stdout, encoding='utf-8').split('\n')
-            for line in text:
-                if mac_address in line:
-                    full_iot_name = line.split()[0]
-                    break
-            else:
-                log.info('Attempt %d to locate %s via MAC address failed', i, iot_name)
-                continue
+            # scan the subnet, reading responses as they arrive and stopping
+            # the scan as soon as the target MAC address is seen
+            with subprocess.Popen(
+                    ['arp-scan', '--localnet', f'--interface={interface}', '--quiet'],
+                    stdout=subprocess.PIPE, text=True) as hosts:
+                for line in hosts.stdout:
+                    if mac_address in line:
+                        full_iot_name = line.split()[0]
+                        hosts.terminate()
+                        break
+                else:
+                    log.info('Attempt %d to locate %s via MAC address failed', i, iot_name)
+                    continue
             break
         else:
             exit(f'Error: unable to determine IP address of {iot_name}')
 
+    _located[(iot_name, mac_address)] = full_iot_name
     return full_iot_name
@@ -1,5 +1,13 @@
+import json
 import logging
 import requests
+from urllib3.util.retry import Retry
+# orjson parses JSON several times faster than the stdlib; fall back when missing
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 # rachio provides an API that allows viewing and modifying the configuration of the
 # irrigation controller, but no direct means to monitor the current state of the valves for
 # polling.
@@ -13,40 +21,66 @@ cloud_rachio = 'https://cloud-rest.rach.io'
 
 log = logging.getLogger(__name__)
 
+# raised on API failures so callers decide whether to retry or give up;
+# the warm session and caches survive, unlike the old exit() paths which
+# forced a full restart (and fresh TLS handshakes) on any hiccup
+class rachioError(Exception):
+    pass
+
+# the zone-run event types this module registers webhooks for
+zone_run_events = frozenset((
+    'DEVICE_ZONE_RUN_STARTED_EVENT',
+    'DEVICE_ZONE_RUN_PAUSED_EVENT',
+    'DEVICE_ZONE_RUN_STOPPED_EVENT',
+    'DEVICE_ZONE_RUN_COMPLETED_EVENT',
+))
+
 class rachio():
     def __init__(self, APIkey, device_name):
 
-        # all requests require authorization using the APIkey
-        self.authorization = {"Authorization": f"Bearer {APIkey}"}
+        # one pooled session keeps connections to the rachio hosts alive
+        # between calls; every request requires authorization using the APIkey,
+        # so carry it in the session's default headers
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {APIkey}",
+            "accept": "application/json",
+        })
+        # only POSTs need more than the session defaults
+        self._post_headers = {"content-type": "application/json"}
+        # transient failures (timeouts, 429/5xx) are retried with backoff by
+        # the adapter rather than by loops at the call sites
+        self.session.mount('https://', requests.adapters.HTTPAdapter(
+                pool_connections=2, pool_maxsize=4,
+                max_retries=Retry(total=3, backoff_factor=0.3,
+                        status_forcelist=(429, 502, 503, 504))))
 
         # get a userId associated with the auth token (the account)
         try:
             site = '{}/info'.format(public_rachio)
-            r = requests.get(site, headers=self.authorization, timeout=5)
+            r = self.session.get(site, timeout=5)
         except requests.exceptions.RequestException as e:
-            exit(f'Error: {e} from {site}')
+            raise rachioError(f'{e} from {site}')
 
         try:
-            self.userId = r.json()['id']
+            self.userId = json_loads(r.content)['id']
             log.info(f'user ID: {self.userId}')
-        except requests.exceptions.JSONDecodeError:
-            exit(f'Error: JSON decode error while processing response from {site}')
+        except ValueError:    # orjson.JSONDecodeError is a subclass
+            raise rachioError(f'JSON decode error while processing response from {site}')
         except KeyError as e:
-            exit(f'Error: Unable to locate key {e} in JSON response from {site}')
+            raise rachioError(f'Unable to locate key {e} in JSON response from {site}')
 
         # use the userId to get all of the other IDs associated with zones, schedules, etc
-        for i in range(1,3):    # sometimes the response times out so try multiple times
-            try:
-                site = '{}/{}'.format(public_rachio, self.userId)
-                r = requests.get(site, headers=self.authorization, timeout=5)
-                break
-            except requests.exceptions.RequestException as e:
-                exit(f'Error: {e} from {site}')
+        try:
+            site = '{}/{}'.format(public_rachio, self.userId)
+            r = self.session.get(site, timeout=5)
+        except requests.exceptions.RequestException as e:
+            raise rachioError(f'{e} from {site}')
 
         try:
-            self.user = r.json()
-        except requests.exceptions.JSONDecodeError:
-            exit('Error: JSON decode error while processing rachio public/info response')
+            self.user = json_loads(r.content)
+        except ValueError:
+            raise rachioError('JSON decode error while processing rachio public/info response')
 
         # locate the requested device
         try:
@@ -54,23 +88,35 @@ class rachio():
                 if d['name'] == device_name:
                     break
             else:
-                raise Exception(f"Controller {device_name} was not found")
+                raise rachioError(f'Controller {device_name} was not found')
         except KeyError as e:
-            exit(f'Error: key error {e} while processing response from {site}')
+            raise rachioError(f'key error {e} while processing response from {site}')
         self.device = d
         log.info('controller ID: %s', d['id'])
 
+        # the webhook endpoint URLs never change once the device is known,
+        # so assemble them once here rather than on every call
+        cid = d['id']
+        self._webhook_create_url = f'{cloud_rachio}/webhook/createWebhook'
+        self._webhook_list_url = f'{cloud_rachio}/webhook/listWebhooks?resource_id.irrigation_controller_id={cid}'
+        self._webhook_delete_url = f'{cloud_rachio}/webhook/deleteAllWebhooks?resource_id.irrigation_controller_id={cid}'
+
+        # cached results of get_zones/list_webhooks; mutating calls clear them
+        self._zones = None
+        self._webhooks = None
+
     # returns dictonary of zone info sorted and indexed by integer zone number
     def get_zones(self):
-        zones = {}
+        if self._zones is not None:
+            return self._zones
         try:
-            for z in self.device['zones']:
-                zoneNumber = int(z['zoneNumber'])
-                zones[zoneNumber] = {'name': z['name'], 'id': z['id']}
+            # sorting the source list first lets one comprehension build the
+            # result already ordered (dicts preserve insertion order)
+            self._zones = {int(z['zoneNumber']): {'name': z['name'], 'id': z['id']}
+                    for z in sorted(self.device['zones'], key=lambda z: int(z['zoneNumber']))}
         except KeyError as e:
-            exit(f'Error: key {e} not found while extacting zone information in rachio public/info response')
-        # sort result by zone number
-        return dict(sorted(zones.items()))
+            raise rachioError(f'key {e} not found while extacting zone information in rachio public/info response')
+        return self._zones
 
     # creates webhook for target_url if not present
     def add_device_zone_run_webhook(self, target_url):
@@ -78,64 +124,56 @@ class rachio():
         # check for existing webhook
         webhooks = self.list_webhooks()
         for hook in webhooks:
-            if 'DEVICE_ZONE_RUN_' not in ' '.join(hook['eventTypes']):
+            if not zone_run_events.intersection(hook['eventTypes']):
                 continue
             if hook['url'] == target_url:
                 log.info(f'Webhook to {target_url} exists')
                 return
-            exit(f"Error - existing webhook already allocated to {hook['url']}")
+            raise rachioError(f"existing webhook already allocated to {hook['url']}")
 
         # create the webhook
-        site = '{}/{}'.format(cloud_rachio, 'webhook/createWebhook')
-        headers = self.authorization | {
-            "accept": "application/json",
-            "content-type": "application/json",
-        }
+        site = self._webhook_create_url
         payload = {
             "resource_id": {
                 "irrigation_controller_id": self.device['id']
             },
             "url": target_url,
-            "event_types": [
-                "DEVICE_ZONE_RUN_STARTED_EVENT",
-                "DEVICE_ZONE_RUN_PAUSED_EVENT",
-                "DEVICE_ZONE_RUN_STOPPED_EVENT",
-                "DEVICE_ZONE_RUN_COMPLETED_EVENT"
-            ],
+            "event_types": sorted(zone_run_events),
         }
 
         try:
-            response = requests.post(site, json=payload, headers=headers, timeout=5)
+            response = self.session.post(site, json=payload, headers=self._post_headers, timeout=5)
         except requests.exceptions.RequestException as e:
-            exit(f'Error: {e} from {site}')
+            raise rachioError(f'{e} from {site}')
+        self._webhooks = None
         log.debug(response.text)
 
     def list_webhooks(self):
-        url = '{}/webhook/listWebhooks?resource_id.irrigation_controller_id={}'.format(cloud_rachio, self.device['id'])
-        headers = self.authorization | {
-            "accept": "application/json",
-        }
+        if self._webhooks is not None:
+            return self._webhooks
+        url = self._webhook_list_url
         try:
-            response = requests.get(url, headers=headers, timeout=5)
+            response = self.session.get(url, timeout=5)
         except requests.exceptions.RequestException as e:
-            exit(f'Error: {e} from {url}')
+            raise rachioError(f'{e} from {url}')
 
         try:
-            webhooks = response.json()['webhooks']
-        except requests.exceptions.JSONDecodeError:
-            exit(f'Error: JSON decode error while processing response from {url}')
+            webhooks = json_loads(response.content)['webhooks']
+        except ValueError:
+            raise rachioError(f'JSON decode error while processing response from {url}')
         except KeyError as e:
-            exit(f'Error: key {e} not found in JSON response from {url}')
+            raise rachioError(f'key {e} not found in JSON response from {url}')
 
+        self._webhooks = webhooks
         return webhooks
 
     def delete_webhooks(self):
-        action = f"webhook/deleteAllWebhooks?resource_id.irrigation_controller_id={self.device['id']}"
-
-        headers = {"accept": "application/json"}
+        try:
+            response = self.session.delete(self._webhook_delete_url, timeout=5)
+        except requests.exceptions.RequestException as e:
+            raise rachioError(f'{e} from {self._webhook_delete_url}')
+        self._webhooks = None
 
-        response = requests.delete('/'.join((cloud_rachio, action)), headers=headers)
-        
         log.debug(response.text)
 
 if __name__ == '__main__':
@@ -150,10 +188,13 @@ if __name__ == '__main__':
     APIkey = args.APIkey
     controllerName = args.ControllerName
 
-    controller = rachio(APIkey, controllerName)
+    try:
+        controller = rachio(APIkey, controllerName)
 
-    print(f"Found controller {controllerName}, id is {controller.device['id']}")
+        print(f"Found controller {controllerName}, id is {controller.device['id']}")
 
-    zones = controller.get_zones()
+        zones = controller.get_zones()
+    except rachioError as e:
+        exit(f'Error: {e}')
 
     pprint.pp(dict(sorted(zones.items(), key=lambda item: item[1]['valve'])), width=150)
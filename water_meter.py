@@ -1,21 +1,55 @@
+import json
 import logging
+import time
 import requests
+# orjson parses JSON several times faster than the stdlib; fall back when missing
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
 log = logging.getLogger(__name__)
 
-def read_meter(name):
+# one session keeps the connection to the meter open between readings instead
+# of paying a TCP handshake per read
+_session = requests.Session()
+_session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=2))
+_session.headers.update({'Connection': 'keep-alive'})
+
+# the most recent successful reading; reused for back-to-back requests so a
+# webhook and a flow-timer callback arriving together share one HTTP round trip
+_cache_time = 0.0
+_cache_name = None
+_cache_data = {}
+_cache_etag = None
+
+def read_meter(name, max_age=2.0):
+    global _cache_time, _cache_name, _cache_data, _cache_etag
+    if name == _cache_name and time.monotonic() - _cache_time < max_age:
+        return _cache_data
     site = f'http://{name}/data.json'
+    # if the meter supplied an ETag with the cached reading, revalidate it -
+    # a 304 saves the body transfer and the JSON re-parse
+    headers = {'If-None-Match': _cache_etag} if _cache_etag and name == _cache_name else None
     try:
-        r = requests.get(site, timeout=5)
+        r = _session.get(site, headers=headers, timeout=5)
+        if r.status_code == 304:
+            _cache_time = time.monotonic()
+            return _cache_data
         r.raise_for_status()
     except requests.exceptions.RequestException as e:
         log.error('Error: %s from %s', e, site)
         return {}
 
     try:
-        data = r.json()
-    except requests.exceptions.JSONDecodeError:
+        data = json_loads(r.content)
+    except ValueError:    # orjson.JSONDecodeError is a subclass
         log.error('Error: JSON decode error while processing response from %s', site)
         return {}
 
+    _cache_time = time.monotonic()
+    _cache_name = name
+    _cache_data = data
+    _cache_etag = r.headers.get('ETag')
     return data